@@ -14,14 +14,50 @@ Features:
 """
 
 import os
+import http.client
 import subprocess
 import json
 import argparse
 import re
+from configparser import ConfigParser, Error as ConfigParserError
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Dict, Set, Optional
+from typing import Any, Iterator, List, Dict, Set, Optional, Tuple
 from urllib.parse import urlparse
 import sys
+import threading
+import time
+
+
+GITHUB_SSH_PREFIX = 'git@github.com:'
+GITHUB_HTTPS_PREFIX = 'https://github.com/'
+
+# SSH format: git@github.com:owner/repo.git
+GITHUB_SSH_RE = re.compile(r'git@github\.com:([^/]+)/(.+?)(?:\.git)?$')
+# HTTPS format: https://github.com/owner/repo.git
+GITHUB_HTTPS_RE = re.compile(r'https://github\.com/([^/]+)/(.+?)(?:\.git)?$')
+
+# Directories that never hold standalone repositories worth scanning
+PRUNE_DIRS = frozenset({
+    'node_modules', 'venv', '.venv', '__pycache__', 'target', 'dist', 'build', '.tox', 'vendor'
+})
+
+# Fork lists are cached here between runs
+CACHE_DIR = Path.home() / '.cache' / 'github-migrate'
+CACHE_TTL_SECONDS = 600
+
+# Fetches one page of forks owned by a user or organization, together with their parents.
+# ownerAffiliations: OWNER leaves out forks the account only collaborates on, as gh does
+FORKS_QUERY = """
+query($login: String!, $cursor: String) {
+  repositoryOwner(login: $login) {
+    repositories(isFork: true, ownerAffiliations: OWNER, first: 100, after: $cursor) {
+      pageInfo { endCursor hasNextPage }
+      nodes { name nameWithOwner isFork url parent { nameWithOwner } }
+    }
+  }
+}
+"""
 
 
 class Colors:
@@ -40,16 +76,61 @@ class Colors:
 class GitHubRepoScanner:
     """Scans local directories for GitHub repositories"""
 
-    def __init__(self, base_path: str):
+    def __init__(self, base_path: str, max_workers: int = 16, max_depth: Optional[int] = 6,
+                 prune: Optional[Set[str]] = None):
         self.base_path = Path(base_path).resolve()
+        self.max_workers = max_workers
+        # Zero or a negative depth means no limit
+        self.max_depth = max_depth if max_depth is not None and max_depth > 0 else None
+        self.depth_skipped = 0
+        self.prune = PRUNE_DIRS | set(prune or ())
         self.local_repos: Dict[str, Dict[str, str]] = {}
 
-    def is_git_repository(self, path: Path) -> bool:
-        """Check if a directory is a git repository"""
-        return (path / '.git').exists()
+    def get_git_dir(self, repo_path: Path) -> Path:
+        """
+        Resolve the git directory holding the repository config
+        Follows the 'gitdir:' pointer used by worktrees and submodules
+        """
+        git_path = repo_path / '.git'
+        if git_path.is_dir():
+            return git_path
+
+        content = git_path.read_text().strip()
+        if not content.startswith('gitdir:'):
+            raise ValueError(f"Unrecognized .git file in {repo_path}")
+        git_dir = Path(content[len('gitdir:'):].strip())
+        if not git_dir.is_absolute():
+            git_dir = (repo_path / git_dir).resolve()
+
+        # Worktrees keep the shared config in the common directory
+        commondir = git_dir / 'commondir'
+        if commondir.is_file():
+            git_dir = (git_dir / commondir.read_text().strip()).resolve()
+        return git_dir
 
     def get_remote_url(self, repo_path: Path, remote_name: str = 'origin') -> Optional[str]:
         """Get the remote URL for a git repository"""
+        try:
+            try:
+                # Common case: .git is a directory, so open its config without stat-ing first
+                text = (repo_path / '.git' / 'config').read_text()
+            except NotADirectoryError:
+                text = (self.get_git_dir(repo_path) / 'config').read_text()
+            # strict=True makes repeated keys or sections raise, so multi-URL remotes
+            # (git uses the first url) go to git instead of keeping the last value
+            config = ConfigParser(strict=True, interpolation=None, inline_comment_prefixes=('#', ';'))
+            config.read_string(text)
+            # A missing section may just be spelled differently; git section names ignore case
+            url = config.get(f'remote "{remote_name}"', 'url', fallback='')
+            if len(url) >= 2 and url[0] == url[-1] == '"':
+                url = url[1:-1]
+            # Anything else may rely on git-only syntax such as insteadOf rewrites
+            if url.startswith((GITHUB_SSH_PREFIX, GITHUB_HTTPS_PREFIX)):
+                return url
+        except (OSError, ValueError, ConfigParserError):
+            pass
+
+        # Fall back to asking git when the config cannot be parsed directly
         try:
             result = subprocess.run(
                 ['git', '-C', str(repo_path), 'remote', 'get-url', remote_name],
@@ -58,7 +139,7 @@ class GitHubRepoScanner:
                 check=True
             )
             return result.stdout.strip()
-        except subprocess.CalledProcessError:
+        except (subprocess.CalledProcessError, OSError):
             return None
 
     def parse_github_url(self, url: str) -> Optional[Dict[str, str]]:
@@ -69,138 +150,317 @@ class GitHubRepoScanner:
         if not url:
             return None
 
-        # SSH format: git@github.com:owner/repo.git
-        ssh_pattern = r'git@github\.com:([^/]+)/(.+?)(?:\.git)?$'
-        # HTTPS format: https://github.com/owner/repo.git
-        https_pattern = r'https://github\.com/([^/]+)/(.+?)(?:\.git)?$'
-
-        for pattern in [ssh_pattern, https_pattern]:
-            match = re.match(pattern, url)
-            if match:
-                owner, repo = match.groups()
-                return {
-                    'owner': owner,
-                    'repo': repo,
-                    'full_name': f"{owner}/{repo}"
-                }
-
-        return None
+        # Fast path for the usual owner/repo[.git] remotes, without running a regex
+        if url.startswith(GITHUB_SSH_PREFIX):
+            rest = url[len(GITHUB_SSH_PREFIX):]
+        elif url.startswith(GITHUB_HTTPS_PREFIX):
+            rest = url[len(GITHUB_HTTPS_PREFIX):]
+        else:
+            return None
+        if rest.endswith('.git'):
+            rest = rest[:-len('.git')]
+        owner, _, repo = rest.partition('/')
+
+        # Leave anything unusual to the full patterns
+        if not owner or not repo:
+            pattern = GITHUB_SSH_RE if url.startswith('git@') else GITHUB_HTTPS_RE
+            match = pattern.match(url)
+            if not match:
+                return None
+            owner, repo = match.groups()
+
+        return {
+            'owner': owner,
+            'repo': repo,
+            'full_name': f"{owner}/{repo}"
+        }
+
+    def iter_repositories(self) -> Iterator[Path]:
+        """
+        Yield every git repository below the base directory
+        Skips hidden and pruned directories (unless they are repositories themselves)
+        and stops descending past max_depth
+        """
+        stack = [(str(self.base_path), 0)]
+        while stack:
+            current, depth = stack.pop()
+            try:
+                with os.scandir(current) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+
+            if any(entry.name == '.git' for entry in entries):
+                # Don't traverse into git repositories
+                yield Path(current)
+                continue
+
+            at_depth_limit = self.max_depth is not None and depth >= self.max_depth
+            for entry in entries:
+                if entry.name.startswith('.') or not entry.is_dir(follow_symlinks=False):
+                    continue
+                if at_depth_limit:
+                    self.depth_skipped += 1
+                    continue
+                if entry.name in self.prune:
+                    # A pruned name can still be a clone in its own right (e.g. ~/projects/build)
+                    if os.path.lexists(os.path.join(entry.path, '.git')):
+                        yield Path(entry.path)
+                    continue
+                stack.append((entry.path, depth + 1))
 
     def scan_directory(self) -> Dict[str, Dict[str, str]]:
         """Scan the base directory for all GitHub repositories"""
         print(f"{Colors.HEADER}Scanning {self.base_path} for GitHub repositories...{Colors.ENDC}")
 
-        for root, dirs, _ in os.walk(self.base_path):
-            # Skip hidden directories except .git
-            dirs[:] = [d for d in dirs if not d.startswith('.') or d == '.git']
-
-            root_path = Path(root)
-
-            if self.is_git_repository(root_path):
-                remote_url = self.get_remote_url(root_path)
-                if remote_url:
-                    repo_info = self.parse_github_url(remote_url)
-                    if repo_info:
-                        full_name = repo_info['full_name']
-                        self.local_repos[full_name] = {
-                            'path': str(root_path),
-                            'owner': repo_info['owner'],
-                            'repo': repo_info['repo'],
-                            'url': remote_url
-                        }
-                        print(f"  {Colors.OKGREEN}✓{Colors.ENDC} Found: {full_name} at {root_path}")
-
-                # Don't traverse into git repositories
-                dirs.clear()
+        # Collect candidate repositories first, then resolve remotes concurrently
+        repo_paths = list(self.iter_repositories())
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            remote_urls = executor.map(self.get_remote_url, repo_paths)
+            for root_path, remote_url in zip(repo_paths, remote_urls):
+                if not remote_url:
+                    continue
+                repo_info = self.parse_github_url(remote_url)
+                if repo_info:
+                    full_name = repo_info['full_name']
+                    self.local_repos[full_name] = {
+                        'path': str(root_path),
+                        'owner': repo_info['owner'],
+                        'repo': repo_info['repo'],
+                        'url': remote_url
+                    }
+                    print(f"  {Colors.OKGREEN}✓{Colors.ENDC} Found: {full_name} at {root_path}")
+
+        if self.depth_skipped:
+            print(f"\n{Colors.WARNING}⚠ Skipped {self.depth_skipped} directories deeper than "
+                  f"--max-depth {self.max_depth}; use --max-depth 0 to scan the whole tree{Colors.ENDC}")
 
         print(f"\n{Colors.OKBLUE}Found {len(self.local_repos)} GitHub repositories locally{Colors.ENDC}\n")
         return self.local_repos
 
 
+class GitHubAPIClient:
+    """Minimal GitHub API client that keeps HTTPS connections alive between requests"""
+
+    API_HOST = 'api.github.com'
+
+    def __init__(self, token: str, timeout: float = 30):
+        self.token = token
+        self.timeout = timeout
+        # One persistent connection per thread; http.client is not thread-safe
+        self._local = threading.local()
+
+    def _get_connection(self) -> http.client.HTTPSConnection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = http.client.HTTPSConnection(self.API_HOST, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def _reset_connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+        self._local.conn = None
+
+    def request(self, method: str, path: str, payload: Optional[Any] = None) -> Tuple[int, Any]:
+        """
+        Send a request to the GitHub API and return the status code and decoded JSON body,
+        or the raw text when the body is not JSON
+        Retries once on a fresh connection if the kept-alive one was dropped
+        """
+        body = json.dumps(payload).encode() if payload is not None else None
+        headers = {
+            'Authorization': f'Bearer {self.token}',
+            'Accept': 'application/vnd.github+json',
+            'User-Agent': 'migrate-github-repos',
+        }
+        if body is not None:
+            headers['Content-Type'] = 'application/json'
+
+        for attempt in range(2):
+            conn = self._get_connection()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+                break
+            except (http.client.HTTPException, OSError):
+                self._reset_connection()
+                if attempt:
+                    raise
+
+        if response.will_close:
+            self._reset_connection()
+        if not data:
+            return response.status, None
+        try:
+            return response.status, json.loads(data)
+        except ValueError:
+            # Error pages from proxies (e.g. 502/503) are not JSON
+            return response.status, data.decode(errors='replace')
+
+    def graphql(self, query: str, variables: Dict[str, Any]) -> Dict[str, Any]:
+        """Run a GraphQL query and return its data, raising on any reported error"""
+        status, result = self.request('POST', '/graphql', {'query': query, 'variables': variables})
+        if status != 200:
+            message = result.get('message') if isinstance(result, dict) else result
+            raise RuntimeError(f"GraphQL request failed ({status}): {message}")
+        if not isinstance(result, dict):
+            raise RuntimeError(f"Unexpected GraphQL response: {result!r}")
+        if result.get('errors'):
+            raise RuntimeError('; '.join(error.get('message', str(error)) for error in result['errors']))
+        if not isinstance(result.get('data'), dict):
+            raise RuntimeError("GraphQL response contained no data")
+        return result['data']
+
+
 class GitHubRepoMigrator:
     """Handles migration of GitHub repositories using GitHub API"""
 
-    def __init__(self, source_token: str, target_token: str, source_username: str, target_username: str):
+    def __init__(self, source_token: str, target_token: str, source_username: str, target_username: str,
+                 max_write_workers: int = 2, min_write_interval: float = 1.0, use_cache: bool = True):
         self.source_token = source_token
         self.target_token = target_token
         self.source_username = source_username
         self.target_username = target_username
-
-    def run_gh_command(self, args: List[str], token: str) -> Optional[str]:
-        """Run a GitHub CLI command with authentication"""
-        env = os.environ.copy()
-        env['GH_TOKEN'] = token
-
+        self.source_api = GitHubAPIClient(source_token)
+        self.target_api = GitHubAPIClient(target_token)
+        self.max_write_workers = max_write_workers
+        self.min_write_interval = min_write_interval
+        self.use_cache = use_cache
+        self.cache_path = CACHE_DIR / f'forks-{source_username}.json'
+        # Age in seconds of the cached fork list, when the last fetch was served from it
+        self.cache_age: Optional[float] = None
+        self._print_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._last_write = 0.0
+
+    def log(self, message: str):
+        """Print a message without interleaving output from worker threads"""
+        with self._print_lock:
+            print(message)
+
+    def throttle_write(self):
+        """Space out write requests to avoid tripping GitHub's secondary rate limits"""
+        with self._write_lock:
+            elapsed = time.monotonic() - self._last_write
+            if elapsed < self.min_write_interval:
+                time.sleep(self.min_write_interval - elapsed)
+            self._last_write = time.monotonic()
+
+    def fetch_forked_repositories(self) -> List[Dict[str, any]]:
+        """
+        Load the source account's forks from the cache or the GitHub API
+        Prints nothing so it can run in the background; raises on API errors
+        """
+        self.cache_age = None
+        if self.use_cache:
+            try:
+                age = time.time() - self.cache_path.stat().st_mtime
+                if age < CACHE_TTL_SECONDS:
+                    repos = json.loads(self.cache_path.read_text())
+                    self.cache_age = age
+                    return repos
+            except (OSError, ValueError):
+                pass
+
+        # Page through forks with GraphQL, 100 repositories (parents included) per request
+        repos = []
+        cursor = None
+        while True:
+            data = self.source_api.graphql(FORKS_QUERY, {'login': self.source_username, 'cursor': cursor})
+            if not data.get('repositoryOwner'):
+                raise RuntimeError(f"User or organization not found: {self.source_username}")
+
+            page = data['repositoryOwner']['repositories']
+            repos.extend(page['nodes'])
+            if not page['pageInfo']['hasNextPage']:
+                break
+            cursor = page['pageInfo']['endCursor']
+
+        # The list can name private forks, so keep the cache readable by the owner only
         try:
-            result = subprocess.run(
-                ['gh'] + args,
-                capture_output=True,
-                text=True,
-                check=True,
-                env=env
-            )
-            return result.stdout
-        except subprocess.CalledProcessError as e:
-            print(f"{Colors.FAIL}Error running gh command: {e.stderr}{Colors.ENDC}")
-            return None
+            self.cache_path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+            fd = os.open(self.cache_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            # Tighten files left behind by older runs too
+            os.chmod(self.cache_path, 0o600)
+            with os.fdopen(fd, 'w') as cache_file:
+                json.dump(repos, cache_file)
+        except OSError:
+            # The cache is only an optimisation
+            pass
 
-    def get_forked_repositories(self) -> List[Dict[str, any]]:
-        """Get all forked repositories from the source account"""
-        print(f"{Colors.HEADER}Fetching forked repositories from {self.source_username}...{Colors.ENDC}")
+        return repos
 
-        # Use GitHub CLI to list repositories
-        output = self.run_gh_command(
-            ['repo', 'list', self.source_username, '--fork', '--json',
-             'name,nameWithOwner,isFork,parent,url', '--limit', '1000'],
-            self.source_token
-        )
+    def get_forked_repositories(self, pending: Optional[Future] = None) -> List[Dict[str, any]]:
+        """
+        Get all forked repositories from the source account
+        Waits on a pending fetch_forked_repositories call if one was started earlier
+        """
+        print(f"{Colors.HEADER}Fetching forked repositories from {self.source_username}...{Colors.ENDC}")
 
-        if not output:
+        try:
+            repos = pending.result() if pending else self.fetch_forked_repositories()
+        except (http.client.HTTPException, OSError, RuntimeError) as e:
+            print(f"{Colors.FAIL}Error fetching forked repositories: {e}{Colors.ENDC}")
             return []
 
-        repos = json.loads(output)
+        if self.cache_age is not None:
+            print(f"{Colors.WARNING}Using fork list cached {int(self.cache_age // 60)}m "
+                  f"{int(self.cache_age % 60)}s ago; pass --no-cache to fetch it again{Colors.ENDC}")
         print(f"{Colors.OKBLUE}Found {len(repos)} forked repositories{Colors.ENDC}\n")
         return repos
 
     def fork_repository(self, repo_full_name: str, dry_run: bool = False) -> bool:
         """Fork a repository to the target account"""
         if dry_run:
-            print(f"  {Colors.WARNING}[DRY RUN]{Colors.ENDC} Would fork: {repo_full_name}")
+            self.log(f"  {Colors.WARNING}[DRY RUN]{Colors.ENDC} Would fork: {repo_full_name}")
             return True
 
-        print(f"  {Colors.OKCYAN}Forking:{Colors.ENDC} {repo_full_name}...")
+        self.log(f"  {Colors.OKCYAN}Forking:{Colors.ENDC} {repo_full_name}...")
 
-        # Fork the repository using gh CLI
-        output = self.run_gh_command(
-            ['repo', 'fork', repo_full_name, '--fork-name', repo_full_name.split('/')[-1]],
-            self.target_token
-        )
+        # Fork the repository through the REST API, reusing the open connection
+        self.throttle_write()
+        try:
+            status, data = self.target_api.request(
+                'POST',
+                f'/repos/{repo_full_name}/forks',
+                {'name': repo_full_name.split('/')[-1]}
+            )
+        except (http.client.HTTPException, OSError) as e:
+            self.log(f"{Colors.FAIL}Error calling GitHub API: {e}{Colors.ENDC}")
+            status, data = None, None
 
-        if output:
-            print(f"  {Colors.OKGREEN}✓{Colors.ENDC} Successfully forked to {self.target_username}")
+        if status in (200, 202):
+            self.log(f"  {Colors.OKGREEN}✓{Colors.ENDC} Successfully forked {repo_full_name} to {self.target_username}")
             return True
         else:
-            print(f"  {Colors.FAIL}✗{Colors.ENDC} Failed to fork")
+            if status is not None:
+                message = data.get('message') if isinstance(data, dict) else data
+                self.log(f"{Colors.FAIL}GitHub API error ({status}): {message}{Colors.ENDC}")
+            self.log(f"  {Colors.FAIL}✗{Colors.ENDC} Failed to fork {repo_full_name}")
             return False
 
-    def migrate_repositories(self, local_repos: Dict[str, Dict[str, str]], dry_run: bool = False):
+    def migrate_repositories(self, local_repos: Dict[str, Dict[str, str]], dry_run: bool = False,
+                             forked_repos: Optional[List[Dict[str, any]]] = None):
         """Migrate forked repositories, excluding local ones"""
-        forked_repos = self.get_forked_repositories()
+        if forked_repos is None:
+            forked_repos = self.get_forked_repositories()
 
         if not forked_repos:
             print(f"{Colors.WARNING}No forked repositories found{Colors.ENDC}")
             return
 
-        # Get set of local repository names
-        local_repo_names = set(local_repos.keys())
-
-        # Filter repositories to migrate
+        # Filter repositories to migrate in a single pass; local_repos is keyed by
+        # full name, so membership checks need no separate set
         repos_to_migrate = []
         repos_skipped = []
 
         for repo in forked_repos:
             repo_name = repo['nameWithOwner']
-            if repo_name in local_repo_names:
+            if repo_name in local_repos:
                 repos_skipped.append(repo_name)
             else:
                 repos_to_migrate.append(repo)
@@ -235,16 +495,23 @@ class GitHubRepoMigrator:
         successful = 0
         failed = 0
 
-        for repo in repos_to_migrate:
-            # Get the parent repository (original) to fork from
-            parent_repo = repo.get('parent', {}).get('nameWithOwner')
-            if parent_repo:
-                if self.fork_repository(parent_repo, dry_run):
+        # Forks are write operations; keep concurrency low to stay clear of
+        # GitHub's secondary rate limits
+        with ThreadPoolExecutor(max_workers=self.max_write_workers) as executor:
+            futures = []
+            for repo in repos_to_migrate:
+                # Get the parent repository (original) to fork from
+                parent_repo = (repo.get('parent') or {}).get('nameWithOwner')
+                if parent_repo:
+                    futures.append(executor.submit(self.fork_repository, parent_repo, dry_run))
+                else:
+                    self.log(f"  {Colors.WARNING}⚠{Colors.ENDC} Skipping {repo['nameWithOwner']}: No parent found")
+
+            for future in as_completed(futures):
+                if future.result():
                     successful += 1
                 else:
                     failed += 1
-            else:
-                print(f"  {Colors.WARNING}⚠{Colors.ENDC} Skipping {repo['nameWithOwner']}: No parent found")
 
         # Final summary
         print(f"\n{Colors.HEADER}Migration Complete!{Colors.ENDC}")
@@ -291,6 +558,24 @@ Environment Variables:
         action='store_true',
         help='Show what would be migrated without actually doing it'
     )
+    parser.add_argument(
+        '--max-depth',
+        type=int,
+        default=6,
+        help='Maximum directory depth to scan below --local-path; 0 means unlimited (default: 6)'
+    )
+    parser.add_argument(
+        '--prune',
+        action='append',
+        default=[],
+        metavar='NAME',
+        help='Additional directory name to skip while scanning (repeatable)'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Ignore the cached fork list and fetch it from GitHub again'
+    )
     parser.add_argument(
         '--source-token',
         help='GitHub token for source account (or set GITHUB_SOURCE_TOKEN env var)'
@@ -321,18 +606,26 @@ Environment Variables:
         print(f"{Colors.FAIL}Error: Local path does not exist: {args.local_path}{Colors.ENDC}")
         sys.exit(1)
 
-    # Step 1: Scan local repositories
-    scanner = GitHubRepoScanner(args.local_path)
-    local_repos = scanner.scan_directory()
-
-    # Step 2: Migrate repositories
     migrator = GitHubRepoMigrator(
         source_token=source_token,
         target_token=target_token,
         source_username=args.source_user,
-        target_username=args.target_user
+        target_username=args.target_user,
+        use_cache=not args.no_cache
     )
-    migrator.migrate_repositories(local_repos, dry_run=args.dry_run)
+
+    # The local scan and the fork list fetch are independent, so run them side by side
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pending_forks = executor.submit(migrator.fetch_forked_repositories)
+
+        # Step 1: Scan local repositories
+        scanner = GitHubRepoScanner(args.local_path, max_depth=args.max_depth, prune=set(args.prune))
+        local_repos = scanner.scan_directory()
+
+        forked_repos = migrator.get_forked_repositories(pending_forks)
+
+    # Step 2: Migrate repositories
+    migrator.migrate_repositories(local_repos, dry_run=args.dry_run, forked_repos=forked_repos)
 
 
 if __name__ == '__main__':